@@ -3,136 +3,222 @@ Local ML orchestrator using GPU-accelerated Whisper (STT) and a fine-tuned
 DistilBERT classifier to map text to intents, then route to Supabase actions.
 """
 
+import os
+import queue
 import re
+import threading
 import time
+from concurrent.futures import Future
 from datetime import datetime
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Callable, Dict, Any, List, NamedTuple, Optional, Tuple, Union
 
 import torch
+from cachetools import TTLCache
 from transformers import pipeline
 
+from supabase_module import get_manager
+
 # Ensure GPU usage when available
 DEVICE_INDEX = 0 if torch.cuda.is_available() else -1
+# Half precision halves weight/activation traffic on GPU; CPU stays in fp32
+MODEL_DTYPE = torch.float16 if DEVICE_INDEX >= 0 else torch.float32
 
-# Lazy-load pipelines (created on first use to reduce startup time)
+# Lazy-load pipelines (created on first use to reduce startup time). The locks stop
+# concurrent first requests on gunicorn's worker threads from each loading a model.
 _stt_pipe = None
 _clf_pipe = None
+_STT_LOAD_LOCK = threading.Lock()
+_CLF_LOAD_LOCK = threading.Lock()
+
+# Training phrases, used to route exact matches without running the classifier
+INTENTS_FILE = os.path.join(os.path.dirname(__file__), 'data', 'intents.csv')
+
+# Short-lived cache of read-only query results keyed on the SQL text; the only
+# read cache in the app. It is per process: a write in one gunicorn worker does not
+# clear the others, so their reads can lag a write by up to the 5 s TTL.
+# Any successful write clears it so bookings are visible immediately, and bumps
+# the generation so a read that overlapped the write does not re-cache old rows.
+_READ_CACHE = TTLCache(maxsize=512, ttl=5)
+_READ_CACHE_LOCK = threading.Lock()
+_READ_CACHE_GEN = 0
+
+# Read queries currently being executed, so concurrent identical requests
+# wait for the one backend call instead of each issuing their own.
+_INFLIGHT: Dict[str, Future] = {}
+_INFLIGHT_LOCK = threading.Lock()
 
-# Label mapping (0..9)
+class IntentSpec(NamedTuple):
+    """Static routing data for one classifier label"""
+    key: str
+    description: str
+    sql: Optional[str]
+    needs_slot_id: bool
+
+
+# Label mapping (0..13)
 LABEL_TO_INTENT = {
-    0: {
-        'key': 'get_available_slots',
-        'description': 'Show all available parking slots',
-        'sql': "SELECT * FROM parking_slots WHERE status='available'",
-        'needs_slot_id': False,
-    },
-    1: {
-        'key': 'get_filled_slots',
-        'description': 'Show all booked (filled) parking slots',
-        'sql': "SELECT * FROM parking_slots WHERE status='booked'",
-        'needs_slot_id': False,
-    },
-    2: {
-        'key': 'book_specific_slot',
-        'description': 'Book a specific parking slot by its ID',
-        'sql': "UPDATE parking_slots SET status='booked' WHERE slot_id={slot_id} AND status='available'",
-        'needs_slot_id': True,
-    },
-    3: {
-        'key': 'book_any_slot',
-        'description': 'Book the next available parking slot',
-        'sql': "UPDATE parking_slots SET status='booked' WHERE slot_id = (SELECT slot_id FROM parking_slots WHERE status='available' LIMIT 1)",
-        'needs_slot_id': False,
-    },
-    4: {
-        'key': 'release_specific_slot',
-        'description': 'Release a specific parking slot by its ID',
-        'sql': "UPDATE parking_slots SET status='available' WHERE slot_id={slot_id}",
-        'needs_slot_id': True,
-    },
-    5: {
-        'key': 'get_specific_slot_status',
-        'description': 'Check status of a specific slot by its ID',
-        'sql': "SELECT * FROM parking_slots WHERE slot_id={slot_id}",
-        'needs_slot_id': True,
-    },
-    6: {
-        'key': 'get_all_slots',
-        'description': 'Show a list of all parking slots',
-        'sql': "SELECT * FROM parking_slots",
-        'needs_slot_id': False,
-    },
-    7: {
-        'key': 'get_available_count',
-        'description': 'Count the number of available slots',
-        'sql': "SELECT COUNT(*) FROM parking_slots WHERE status='available'",
-        'needs_slot_id': False,
-    },
-    8: {
-        'key': 'get_filled_count',
-        'description': 'Count the number of booked (filled) slots',
-        'sql': "SELECT COUNT(*) FROM parking_slots WHERE status='booked'",
-        'needs_slot_id': False,
-    },
-    9: {
-        'key': 'release_all_slots',
-        'description': 'Release all booked parking slots',
-        'sql': "UPDATE parking_slots SET status='available' WHERE status='booked'",
-        'needs_slot_id': False,
-    },
-    10: {
-        'key': 'book_all_slots',
-        'description': 'Book all available parking slots',
-        'sql': "UPDATE parking_slots SET status='booked' WHERE status='available'",
-        'needs_slot_id': False,
-    },
-    11: {
-        'key': 'set_maintenance',
-        'description': 'Set a specific slot to maintenance mode',
-        'sql': "UPDATE parking_slots SET status='maintenance' WHERE slot_id={slot_id}",
-        'needs_slot_id': True,
-    },
-    12: {
-        'key': 'get_maintenance_slots',
-        'description': 'Show all slots in maintenance mode',
-        'sql': "SELECT * FROM parking_slots WHERE status='maintenance'",
-        'needs_slot_id': False,
-    },
-    13: {
-        'key': 'fallback',
-        'description': 'Out-of-scope request, do nothing',
-        'sql': None,
-        'needs_slot_id': False,
-    },
+    0: IntentSpec(
+        key='get_available_slots',
+        description='Show all available parking slots',
+        sql="SELECT * FROM parking_slots WHERE status='available'",
+        needs_slot_id=False,
+    ),
+    1: IntentSpec(
+        key='get_filled_slots',
+        description='Show all booked (filled) parking slots',
+        sql="SELECT * FROM parking_slots WHERE status='booked'",
+        needs_slot_id=False,
+    ),
+    2: IntentSpec(
+        key='book_specific_slot',
+        description='Book a specific parking slot by its ID',
+        sql="UPDATE parking_slots SET status='booked' WHERE slot_id={slot_id} AND status='available'",
+        needs_slot_id=True,
+    ),
+    3: IntentSpec(
+        key='book_any_slot',
+        description='Book the next available parking slot',
+        sql="UPDATE parking_slots SET status='booked' WHERE slot_id = (SELECT slot_id FROM parking_slots WHERE status='available' LIMIT 1)",
+        needs_slot_id=False,
+    ),
+    4: IntentSpec(
+        key='release_specific_slot',
+        description='Release a specific parking slot by its ID',
+        sql="UPDATE parking_slots SET status='available' WHERE slot_id={slot_id}",
+        needs_slot_id=True,
+    ),
+    5: IntentSpec(
+        key='get_specific_slot_status',
+        description='Check status of a specific slot by its ID',
+        sql="SELECT * FROM parking_slots WHERE slot_id={slot_id}",
+        needs_slot_id=True,
+    ),
+    6: IntentSpec(
+        key='get_all_slots',
+        description='Show a list of all parking slots',
+        sql="SELECT * FROM parking_slots",
+        needs_slot_id=False,
+    ),
+    7: IntentSpec(
+        key='get_available_count',
+        description='Count the number of available slots',
+        sql="SELECT COUNT(*) FROM parking_slots WHERE status='available'",
+        needs_slot_id=False,
+    ),
+    8: IntentSpec(
+        key='get_filled_count',
+        description='Count the number of booked (filled) slots',
+        sql="SELECT COUNT(*) FROM parking_slots WHERE status='booked'",
+        needs_slot_id=False,
+    ),
+    9: IntentSpec(
+        key='release_all_slots',
+        description='Release all booked parking slots',
+        sql="UPDATE parking_slots SET status='available' WHERE status='booked'",
+        needs_slot_id=False,
+    ),
+    10: IntentSpec(
+        key='book_all_slots',
+        description='Book all available parking slots',
+        sql="UPDATE parking_slots SET status='booked' WHERE status='available'",
+        needs_slot_id=False,
+    ),
+    11: IntentSpec(
+        key='set_maintenance',
+        description='Set a specific slot to maintenance mode',
+        sql="UPDATE parking_slots SET status='maintenance' WHERE slot_id={slot_id}",
+        needs_slot_id=True,
+    ),
+    12: IntentSpec(
+        key='get_maintenance_slots',
+        description='Show all slots in maintenance mode',
+        sql="SELECT * FROM parking_slots WHERE status='maintenance'",
+        needs_slot_id=False,
+    ),
+    13: IntentSpec(
+        key='fallback',
+        description='Out-of-scope request, do nothing',
+        sql=None,
+        needs_slot_id=False,
+    ),
 }
 
+# SQL placeholders such as {slot_id}
+_PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+
+
+def _sql_formatter(template: Optional[str]) -> Callable[[Dict[str, Any]], Optional[str]]:
+    # Templates without placeholders are returned as-is; the rest fill every
+    # placeholder in one format_map call instead of a replace() per parameter
+    if template is None or not _PLACEHOLDER_RE.search(template):
+        return lambda params: template
+    return template.format_map
+
+
+# Hot-path views of the label table, indexed directly by label id
+_INTENTS: Tuple[IntentSpec, ...] = tuple(LABEL_TO_INTENT[i] for i in range(len(LABEL_TO_INTENT)))
+_FALLBACK_LABEL = 13
+# One formatter per label, built once at import
+_SQL_FORMATTERS = tuple(_sql_formatter(spec.sql) for spec in _INTENTS)
+
 def _load_stt_pipeline():
     global _stt_pipe
     if _stt_pipe is None:
-        _stt_pipe = pipeline(
-            "automatic-speech-recognition",
-            model="openai/whisper-base",
-            device=DEVICE_INDEX,
-        )
+        with _STT_LOAD_LOCK:
+            if _stt_pipe is None:
+                _stt_pipe = pipeline(
+                    "automatic-speech-recognition",
+                    model="openai/whisper-base",
+                    device=DEVICE_INDEX,
+                    torch_dtype=MODEL_DTYPE,
+                    # Split long uploads into Whisper-sized windows and decode them as a batch
+                    chunk_length_s=30,
+                    batch_size=8,
+                )
     return _stt_pipe
 
 
 def _load_classifier_pipeline():
     global _clf_pipe
     if _clf_pipe is None:
-        _clf_pipe = pipeline(
-            "text-classification",
-            model="ai_pipeline/models/parking_intent_model",
-            device=DEVICE_INDEX,
-        )
+        with _CLF_LOAD_LOCK:
+            if _clf_pipe is None:
+                _clf_pipe = pipeline(
+                    "text-classification",
+                    model="ai_pipeline/models/parking_intent_model",
+                    device=DEVICE_INDEX,
+                    torch_dtype=MODEL_DTYPE,
+                )
     return _clf_pipe
 
 
-def transcribe_audio_file(audio_path: str) -> Dict[str, Any]:
+# (epoch second, ISO string) of the last formatted timestamp; swapped as one tuple
+_TS_CACHE: Tuple[int, str] = (0, '')
+
+
+def now_iso() -> str:
+    """Current local time as an ISO string, formatted at most once per second"""
+    global _TS_CACHE
+    second = int(time.time())
+    cached_second, cached = _TS_CACHE
+    if second != cached_second:
+        cached = datetime.fromtimestamp(second).isoformat()
+        _TS_CACHE = (second, cached)
+    return cached
+
+
+def warm_up() -> None:
+    """Load the classifier and run one forward pass so the first query skips model init"""
+    _load_classifier_pipeline()("warm up")
+
+
+def transcribe_audio_file(audio: Union[str, bytes]) -> Dict[str, Any]:
+    # Accepts a file path or the raw encoded audio bytes (decoded via ffmpeg either way)
     stt = _load_stt_pipeline()
     start = time.time()
     try:
-        result = stt(audio_path)
+        result = stt(audio)
         text = result.get('text', '').strip()
         return {
             'success': True,
@@ -147,138 +233,263 @@ def transcribe_audio_file(audio_path: str) -> Dict[str, Any]:
         }
 
 
+# Slot number and whitespace patterns, compiled once instead of on every classified query
+_SLOT_RE = re.compile(r"slot\s*(?:number\s*)?(\d+)")
+_NUMBER_RE = re.compile(r"\b(\d+)\b")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
 def _extract_slot_id(text: str) -> int:
-    match = re.search(r"slot\s*(?:number\s*)?(\d+)", text)
+    match = _SLOT_RE.search(text)
     if match:
         return int(match.group(1))
     # fallback: any standalone number
-    match = re.search(r"\b(\d+)\b", text)
+    match = _NUMBER_RE.search(text)
     return int(match.group(1)) if match else -1
 
 
-def classify_text(text: str) -> Dict[str, Any]:
-    clf = _load_classifier_pipeline()
-    result = clf(text)
-    # Expecting like: [{'label': 'LABEL_3', 'score': 0.98}]
-    label_str = result[0]['label']
-    score = float(result[0]['score'])
+def _normalize_text(text: str) -> str:
+    # The classifier is uncased, so case and spacing never change the prediction
+    return _WHITESPACE_RE.sub(" ", text.strip().lower())
+
+
+@lru_cache(maxsize=1024)
+def _run_classifier(text: str) -> Tuple[int, float]:
+    # Concurrent misses share one batched forward pass
+    result = _CLASSIFIER_BATCHER.submit(text)
+    # Expecting like: {'label': 'LABEL_3', 'score': 0.98}
+    label_str = result['label']
+    score = float(result['score'])
     try:
         label_id = int(label_str.split('_')[-1])
     except Exception:
         label_id = 9  # fallback
+    return label_id, score
+
+
+@lru_cache(maxsize=1)
+def _load_exact_phrases() -> Dict[str, int]:
+    """Map every training phrase that has exactly one label to that label"""
+    labels: Dict[str, set] = {}
+    try:
+        with open(INTENTS_FILE, encoding='utf-8') as f:
+            next(f, None)  # header
+            for line in f:
+                phrase, sep, label = line.rpartition(',')
+                if sep and label.strip().isdigit():
+                    labels.setdefault(_normalize_text(phrase), set()).add(int(label))
+    except OSError:
+        return {}
+    return {phrase: ids.pop() for phrase, ids in labels.items() if len(ids) == 1}
+
+
+def _classify_normalized(normalized: str) -> Dict[str, Any]:
+    # Canonical commands ("show available slots") are routed by dictionary lookup
+    label_id = _load_exact_phrases().get(normalized)
+    if label_id is not None:
+        return {'label_id': label_id, 'score': 1.0}
+    # Voice commands repeat heavily, so identical phrases skip the forward pass
+    label_id, score = _run_classifier(normalized)
     return {'label_id': label_id, 'score': score}
 
 
-def _tts_text_for(intent_key: str, sql_result: Dict[str, Any], params: Dict[str, Any]) -> str:
+def classify_text(text: str) -> Dict[str, Any]:
+    return _classify_normalized(_normalize_text(text))
+
+
+# Spoken reply per intent; {count} and {slot_id} are filled from the query result
+_TTS_TEMPLATES = {
+    'get_available_slots': "Found {count} available parking slots.",
+    'get_filled_slots': "Found {count} booked parking slots.",
+    'get_all_slots': "Retrieved {count} parking slots.",
+    'book_specific_slot': "Slot {slot_id} has been booked successfully.",
+    'book_all_slots': "Successfully booked {count} available parking slots.",
+    'release_specific_slot': "Slot {slot_id} has been released successfully.",
+    'release_all_slots': "Successfully released {count} booked parking slots.",
+    'get_specific_slot_status': "Retrieved status for slot {slot_id}.",
+    'get_available_count': "There are {count} available parking slots.",
+    'get_filled_count': "There are {count} booked parking slots.",
+    'set_maintenance': "Slot {slot_id} has been set to maintenance mode.",
+    'get_maintenance_slots': "Found {count} slots in maintenance mode.",
+    # Legacy support for old keys
+    'available_slots': "Found {count} available parking slots.",
+    'booked_slots': "Found {count} booked parking slots.",
+    'all_slots': "Retrieved {count} parking slots.",
+    'book_slot': "Slot {slot_id} has been booked successfully.",
+    'release_slot': "Slot {slot_id} has been released successfully.",
+    'vehicles': "Retrieved {count} vehicles.",
+    'users': "Retrieved {count} users.",
+    'parking_logs': "Retrieved {count} parking logs.",
+    'slot_status': "Returned status for slot {slot_id}.",
+}
+
+
+def _tts_text_for(intent_key: str, sql_result: Dict[str, Any], params: Dict[str, Any], data: Any, count: int) -> str:
     if not sql_result.get('success'):
         return f"Query failed: {sql_result.get('error', 'Unknown error')}"
-    data = sql_result.get('data', []) if isinstance(sql_result, dict) else []
-    count = len(data) if isinstance(data, list) else 0
     
-    # Handle intent keys from LABEL_TO_INTENT
-    if intent_key == 'get_available_slots':
-        return f"Found {count} available parking slots."
-    if intent_key == 'get_filled_slots':
-        return f"Found {count} booked parking slots."
-    if intent_key == 'get_all_slots':
-        return f"Retrieved {count} parking slots."
-    if intent_key == 'book_specific_slot':
-        return f"Slot {params.get('slot_id', 'unknown')} has been booked successfully."
     if intent_key == 'book_any_slot':
         # Extract slot_id from the result data
-        if data and len(data) > 0 and 'slot_id' in data[0]:
-            slot_id = data[0]['slot_id']
-            return f"Slot {slot_id} has been booked successfully."
+        if data and 'slot_id' in data[0]:
+            return f"Slot {data[0]['slot_id']} has been booked successfully."
         return "A parking slot has been booked successfully."
-    if intent_key == 'book_all_slots':
-        return f"Successfully booked {count} available parking slots."
-    if intent_key == 'release_specific_slot':
-        return f"Slot {params.get('slot_id', 'unknown')} has been released successfully."
-    if intent_key == 'release_all_slots':
-        return f"Successfully released {count} booked parking slots."
-    if intent_key == 'get_specific_slot_status':
-        return f"Retrieved status for slot {params.get('slot_id', 'unknown')}."
-    if intent_key == 'get_available_count':
-        return f"There are {count} available parking slots."
-    if intent_key == 'get_filled_count':
-        return f"There are {count} booked parking slots."
-    if intent_key == 'set_maintenance':
-        return f"Slot {params.get('slot_id', 'unknown')} has been set to maintenance mode."
-    if intent_key == 'get_maintenance_slots':
-        return f"Found {count} slots in maintenance mode."
-    
-    # Legacy support for old keys
-    if intent_key == 'available_slots':
-        return f"Found {count} available parking slots."
-    if intent_key == 'booked_slots':
-        return f"Found {count} booked parking slots."
-    if intent_key == 'all_slots':
-        return f"Retrieved {count} parking slots."
-    if intent_key == 'book_slot':
-        return f"Slot {params.get('slot_id', 'unknown')} has been booked successfully."
-    if intent_key == 'release_slot':
-        return f"Slot {params.get('slot_id', 'unknown')} has been released successfully."
-    if intent_key in {'vehicles', 'users', 'parking_logs'}:
-        entity = 'records'
-        if intent_key == 'vehicles':
-            entity = 'vehicles'
-        elif intent_key == 'users':
-            entity = 'users'
-        elif intent_key == 'parking_logs':
-            entity = 'parking logs'
-        return f"Retrieved {count} {entity}."
-    if intent_key == 'slot_status':
-        return f"Returned status for slot {params.get('slot_id', 'unknown')}."
     
-    return "Query executed successfully."
+    template = _TTS_TEMPLATES.get(intent_key)
+    if template is None:
+        return "Query executed successfully."
+    return template.format(count=count, slot_id=params.get('slot_id', 'unknown'))
+
+
+class _ClassifierBatcher:
+    """
+    Collects classifier inputs arriving within a short window and runs them as one
+    forward pass, fanning the predictions back to the waiting requests.
+    """
+
+    def __init__(self, max_batch: int = 32, max_wait: float = 0.005):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, text: str) -> Dict[str, Any]:
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def _ensure_started(self) -> None:
+        # Started lazily (and restarted after fork) so every worker owns its thread
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='classifier-batcher', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        # One thread collects and runs batches back to back on the single model
+        # instance; inputs queued during a forward pass form the next batch
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: List[Tuple[str, Future]]) -> None:
+        texts = [text for text, _ in batch]
+        try:
+            clf = _load_classifier_pipeline()
+            results = clf(texts, batch_size=len(texts))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+_CLASSIFIER_BATCHER = _ClassifierBatcher()
+
+
+def _execute_sql(sql_query: str) -> Dict[str, Any]:
+    global _READ_CACHE_GEN
+    if not sql_query.lstrip().upper().startswith('SELECT'):
+        sql_result = get_manager().execute_query(sql_query)
+        if sql_result.get('success'):
+            with _READ_CACHE_LOCK:
+                _READ_CACHE.clear()
+                _READ_CACHE_GEN += 1
+        return sql_result
+
+    with _READ_CACHE_LOCK:
+        cached = _READ_CACHE.get(sql_query)
+        generation = _READ_CACHE_GEN
+    if cached is not None:
+        return cached
+
+    with _INFLIGHT_LOCK:
+        future = _INFLIGHT.get(sql_query)
+        is_leader = future is None
+        if is_leader:
+            future = _INFLIGHT[sql_query] = Future()
+    if not is_leader:
+        return future.result()
+
+    try:
+        sql_result = get_manager().execute_query(sql_query)
+        if sql_result.get('success'):
+            with _READ_CACHE_LOCK:
+                if generation == _READ_CACHE_GEN:
+                    _READ_CACHE[sql_query] = sql_result
+        future.set_result(sql_result)
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _INFLIGHT_LOCK:
+            del _INFLIGHT[sql_query]
+    return sql_result
 
 
 def process_text_query(text: str) -> Dict[str, Any]:
     """
     Full pipeline for text input: classify -> build SQL -> execute -> response.
     """
-    from supabase_module import supabase_manager  # local import to avoid cycles
-
-    classification = classify_text(text)
+    # Lowercase once; the slot patterns are lowercase, so no IGNORECASE is needed
+    normalized = _normalize_text(text)
+    classification = _classify_normalized(normalized)
     label_id = classification['label_id']
-    label_info = LABEL_TO_INTENT.get(label_id, LABEL_TO_INTENT[13])
+    if not 0 <= label_id < len(_INTENTS):
+        label_id = _FALLBACK_LABEL
+    label_info = _INTENTS[label_id]
 
-    if label_info['key'] == 'fallback' or label_id == 13:
+    if label_id == _FALLBACK_LABEL:
         return {
             'success': False,
             'error': 'Out-of-scope request. Supported queries: available slots, booked slots, all slots, book slot <n>, release slot <n>, vehicles, users, logs, slot status <n>.',
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': now_iso(),
         }
 
     params: Dict[str, Any] = {}
-    if label_info['needs_slot_id']:
-        slot_id = _extract_slot_id(text)
+    if label_info.needs_slot_id:
+        slot_id = _extract_slot_id(normalized)
         if slot_id <= 0:
             return {
                 'success': False,
                 'error': 'Missing or invalid slot number. Try like: "book slot 3".',
-                'timestamp': datetime.now().isoformat(),
+                'timestamp': now_iso(),
             }
         params['slot_id'] = slot_id
 
-    sql_query = label_info['sql']
-    if params:
-        for k, v in params.items():
-            sql_query = sql_query.replace(f"{{{k}}}", str(v))
+    sql_query = _SQL_FORMATTERS[label_id](params)
+
+    sql_result = _execute_sql(sql_query)
 
-    sql_result = supabase_manager.execute_query(sql_query)
+    # Read the result once and build the TTS text alongside the response
+    intent_key = label_info.key
+    data = sql_result.get('data', [])
+    # COUNT queries carry the total in 'count' and return no rows
+    count = sql_result['count'] if 'count' in sql_result else len(data) if isinstance(data, list) else 0
 
-    response: Dict[str, Any] = {
-        'success': True if sql_result and sql_result.get('success') else False,
+    return {
+        'success': True if sql_result.get('success') else False,
         'voice_text': text,
-        'query_type': label_info['key'],
-        'description': label_info['description'],
+        'query_type': intent_key,
+        'description': label_info.description,
         'sql_query': sql_query,
         'database_result': sql_result,
-        'timestamp': datetime.now().isoformat(),
+        'timestamp': now_iso(),
+        'tts_text': _tts_text_for(intent_key, sql_result, params, data, count),
     }
 
-    response['tts_text'] = _tts_text_for(label_info['key'], sql_result, params)
-    return response
-
 
@@ -3,85 +3,170 @@ Flask application for AI Powered Voice-to-Query Parking Management System
 Main application file with routes and voice processing
 """
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, g
+from flask.json.provider import DefaultJSONProvider
+from flask_compress import Compress
+import orjson
 import os
+import hashlib
+import tempfile
+import time
+import queue
+import atexit
 import logging
-from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 import json
 
 # Import custom modules
 # Remove rule-based voice module usage; frontend handles browser STT
-from supabase_module import supabase_manager
-from ai_pipeline.local_orchestrator import process_text_query, transcribe_audio_file, LABEL_TO_INTENT
+from supabase_module import get_manager
+from ai_pipeline.local_orchestrator import process_text_query, transcribe_audio_file, now_iso, LABEL_TO_INTENT
 from config import get_config
 
 # Get configuration
 config = get_config()
 
-# Configure logging
-logging.basicConfig(
-    level=getattr(logging, config.LOG_LEVEL),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(config.LOG_FILE),
-        logging.StreamHandler()
-    ]
-)
+# Configure logging: request threads only enqueue records, a background
+# listener thread owns the file/stream handlers and does the actual I/O
+_log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+_log_handlers = [logging.FileHandler(config.LOG_FILE), logging.StreamHandler()]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
+
+_log_listener = None
+
+def start_log_listener():
+    """
+    Route root logging through a fresh queue and listener thread
+    Called at import and again in each forked gunicorn worker, where the
+    parent's listener thread does not exist
+    """
+    global _log_listener
+    log_queue = queue.SimpleQueue()
+    logging.root.handlers = [QueueHandler(log_queue)]
+    _log_listener = QueueListener(log_queue, *_log_handlers, respect_handler_level=True)
+    _log_listener.start()
+
+def _stop_log_listener():
+    _log_listener.stop()
+
+logging.root.setLevel(getattr(logging, config.LOG_LEVEL))
+start_log_listener()
+atexit.register(_stop_log_listener)
 logger = logging.getLogger(__name__)
 
+def _orjson_dumps(obj) -> bytes:
+    return orjson.dumps(obj, default=DefaultJSONProvider.default, option=orjson.OPT_NON_STR_KEYS)
+
+class ORJSONProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson for faster response serialization"""
+
+    def dumps(self, obj, **kwargs):
+        return _orjson_dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # jsonify() path: hand orjson's bytes straight to the response, skipping
+        # the decode to str and re-encode to UTF-8 the base implementation does
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(_orjson_dumps(obj), mimetype=self.mimetype)
+
 # Initialize Flask app
 app = Flask(__name__)
 app.config.from_object(config)
+app.json = ORJSONProvider(app)
+Compress(app)
+
+# Share one pooled PostgREST session across all requests; every gunicorn thread
+# can keep its connection warm between queries instead of re-handshaking
+get_manager().configure_pool(
+    pool_maxsize=config.DB_POOL_SIZE + config.DB_MAX_OVERFLOW,
+    pool_keepalive=config.DB_POOL_SIZE + config.DB_MAX_OVERFLOW,
+    keepalive_expiry=config.DB_KEEPALIVE_EXPIRY,
+)
+
+@app.before_request
+def _stamp_request():
+    """Compute the response timestamp once per request"""
+    g.ts = now_iso()
 
 @app.route('/')
 def index():
     """Home page with voice recognition interface"""
     return render_template('index.html')
 
+# Static reply for the legacy /voice_input endpoint, built once at import
+_VOICE_INPUT_ERROR = 'Browser speech recognition is recommended. For server-side STT, add /stt_query with audio upload.'
+
 @app.route('/voice_input', methods=['POST'])
 def voice_input():
     """Handle voice input from frontend (kept for compatibility)"""
     try:
         return jsonify({
             'success': False,
-            'error': 'Browser speech recognition is recommended. For server-side STT, add /stt_query with audio upload.',
-            'timestamp': datetime.now().isoformat()
+            'error': _VOICE_INPUT_ERROR,
+            'timestamp': g.ts
         })
     except Exception as e:
-        logger.error(f"Error in voice input: {e}")
+        logger.error("Error in voice input: %s", e)
         return jsonify({
             'success': False,
             'error': f'Voice input error: {str(e)}',
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g.ts
         })
 
+# Canned bodies for malformed requests, serialized once at import
+_NO_TEXT_JSON = _orjson_dumps({'success': False, 'error': 'No voice text provided'})
+_NO_AUDIO_JSON = _orjson_dumps({'success': False, 'error': 'No audio file provided'})
+_NO_SPEECH_ERROR = 'No speech detected'
+
+# Responses with more rows than this are streamed instead of serialized in one piece
+# (uncompressed: COMPRESS_STREAMS is off so Flask-Compress doesn't buffer the stream)
+_STREAM_ROW_THRESHOLD = 100
+_STREAM_CHUNK_ROWS = 100
+
+def _stream_query_response(response: dict):
+    """Yield a query response as JSON, emitting database_result rows in chunks"""
+    db_result = response['database_result']
+    rows = db_result['data']
+    envelope = {k: v for k, v in response.items() if k != 'database_result'}
+    db_envelope = {k: v for k, v in db_result.items() if k != 'data'}
+    
+    # Both envelopes always carry keys ('success' at least), so reopening them is safe
+    yield _orjson_dumps(envelope)[:-1] + b',"database_result":' + _orjson_dumps(db_envelope)[:-1] + b',"data":['
+    for start in range(0, len(rows), _STREAM_CHUNK_ROWS):
+        chunk = b','.join(_orjson_dumps(row) for row in rows[start:start + _STREAM_CHUNK_ROWS])
+        yield (b',' if start else b'') + chunk
+    yield b']}}'
+
 @app.route('/query', methods=['POST'])
 @app.route('/text_query', methods=['POST'])  # Alias for text-based queries
 def process_query():
     """Process voice command and execute database query"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         voice_text = data.get('text', '').strip()
         
         if not voice_text:
-            return jsonify({
-                'success': False,
-                'error': 'No voice text provided',
-                'timestamp': datetime.now().isoformat()
-            })
+            return Response(_NO_TEXT_JSON, status=400, mimetype='application/json')
         
-        logger.info(f"Processing query for text: '{voice_text}'")
+        logger.info("Processing query for text: '%s'", voice_text)
         
         # Route via ML orchestrator (classifier on GPU)
         response = process_text_query(voice_text)
+        rows = response.get('database_result', {}).get('data')
+        if isinstance(rows, list) and len(rows) > _STREAM_ROW_THRESHOLD:
+            return Response(_stream_query_response(response), mimetype='application/json')
         return jsonify(response)
         
     except Exception as e:
-        logger.error(f"Error processing query: {e}")
+        logger.error("Error processing query: %s", e)
         return jsonify({
             'success': False,
             'error': f'Query processing error: {str(e)}',
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g.ts
         })
 
 @app.route('/test_microphone', methods=['POST'])
@@ -92,40 +177,61 @@ def test_microphone():
             'success': True,
             'microphone_working': True,
             'available_microphones': ['Browser Microphone'],
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g.ts
         })
     except Exception as e:
-        logger.error(f"Error testing microphone: {e}")
+        logger.error("Error testing microphone: %s", e)
         return jsonify({
             'success': False,
             'error': f'Microphone test error: {str(e)}',
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g.ts
         })
 
+# Supported intents never change at runtime, so serialize them once at import
+_SUPPORTED_COMMANDS_JSON = app.json.dumps({
+    'success': True,
+    'commands': {
+        meta.key: {
+            'description': meta.description,
+            'patterns': []
+        }
+        for meta in LABEL_TO_INTENT.values()
+        if meta.key != 'fallback'
+    }
+})
+_SUPPORTED_COMMANDS_ETAG = hashlib.sha1(_SUPPORTED_COMMANDS_JSON.encode()).hexdigest()
+
 @app.route('/supported_commands', methods=['GET'])
 def supported_commands():
     """Get list of supported intents from ML router"""
+    response = Response(
+        _SUPPORTED_COMMANDS_JSON,
+        mimetype='application/json',
+        headers={'Cache-Control': 'public, max-age=3600'}
+    )
+    # Revalidating clients get a bodiless 304 instead of the full list
+    response.set_etag(_SUPPORTED_COMMANDS_ETAG)
+    return response.make_conditional(request)
+
+# Uploads up to this size are transcribed from memory instead of a temp file
+_STT_IN_MEMORY_MAX_BYTES = 1024 * 1024
+# Larger uploads are spooled here; created once at import, not per request
+_UPLOAD_DIR = 'logs'
+os.makedirs(_UPLOAD_DIR, exist_ok=True)
+
+def _transcribe_upload(f) -> dict:
+    """Run STT on an uploaded file, from memory when small, else via a unique temp file"""
+    if request.content_length is not None and request.content_length <= _STT_IN_MEMORY_MAX_BYTES:
+        # Short voice clips go straight from the request buffer to the decoder
+        return transcribe_audio_file(f.read())
+    tmp = tempfile.NamedTemporaryFile(dir=_UPLOAD_DIR, prefix='upload_', suffix='.wav', delete=False)
     try:
-        commands = {}
-        for _, meta in LABEL_TO_INTENT.items():
-            if meta['key'] == 'fallback':
-                continue
-            commands[meta['key']] = {
-                'description': meta['description'],
-                'patterns': []
-            }
-        return jsonify({
-            'success': True,
-            'commands': commands,
-            'timestamp': datetime.now().isoformat()
-        })
-    except Exception as e:
-        logger.error(f"Error getting supported commands: {e}")
-        return jsonify({
-            'success': False,
-            'error': f'Error getting commands: {str(e)}',
-            'timestamp': datetime.now().isoformat()
-        })
+        # Closed before decoding; unlinked even if the save itself fails
+        with tmp:
+            f.save(tmp)
+        return transcribe_audio_file(tmp.name)
+    finally:
+        os.unlink(tmp.name)
 
 @app.route('/stt_query', methods=['POST'])
 def stt_query():
@@ -136,91 +242,57 @@ def stt_query():
         elif 'file' in request.files:
             f = request.files['file']
         else:
-            return jsonify({'success': False, 'error': 'No audio file provided', 'timestamp': datetime.now().isoformat()})
-
-        tmp_path = os.path.join('logs', f'upload_{int(time.time())}.wav')
-        os.makedirs('logs', exist_ok=True)
-        f.save(tmp_path)
+            return Response(_NO_AUDIO_JSON, status=400, mimetype='application/json')
 
-        stt_res = transcribe_audio_file(tmp_path)
+        stt_res = _transcribe_upload(f)
         if not stt_res.get('success'):
-            return jsonify({'success': False, 'error': stt_res.get('error', 'STT failed'), 'timestamp': datetime.now().isoformat()})
+            return jsonify({'success': False, 'error': stt_res.get('error', 'STT failed'), 'timestamp': g.ts})
+        # Silence transcribes to an empty string; skip the classifier and database
+        if not stt_res['text']:
+            return jsonify({'success': False, 'error': _NO_SPEECH_ERROR, 'timestamp': g.ts})
 
         response = process_text_query(stt_res['text'])
         return jsonify(response)
     except Exception as e:
-        logger.error(f"/stt_query error: {e}")
-        return jsonify({'success': False, 'error': str(e), 'timestamp': datetime.now().isoformat()})
+        logger.error("/stt_query error: %s", e)
+        return jsonify({'success': False, 'error': str(e), 'timestamp': g.ts})
+
+# Last database probe result, reused for HEALTH_CHECK_TTL seconds so frequent
+# load balancer probes don't add Supabase traffic
+_HEALTH_CACHE = {'checked_at': 0.0, 'db_healthy': False}
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     try:
-        # Test database connection
-        db_test = supabase_manager.get_available_slots()
-        db_healthy = db_test.get('success', False)
+        # Test database connection with a single one-row read
+        now = time.monotonic()
+        if now - _HEALTH_CACHE['checked_at'] > config.HEALTH_CHECK_TTL:
+            db_test = get_manager().ping()
+            _HEALTH_CACHE.update(checked_at=now, db_healthy=db_test.get('success', False))
+        db_healthy = _HEALTH_CACHE['db_healthy']
         
         return jsonify({
             'status': 'healthy',
             'database': 'connected' if db_healthy else 'disconnected',
-            'timestamp': datetime.now().isoformat()
+            'db_pool': get_manager().get_pool_stats(),
+            'timestamp': g.ts
         })
         
     except Exception as e:
         return jsonify({
             'status': 'unhealthy',
             'error': str(e),
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g.ts
         })
 
-def _generate_tts_response(query_info: dict, result: dict) -> str:
-    """Generate text-to-speech response based on query and result"""
-    try:
-        query_type = query_info['query_type']
-        description = query_info['description']
-        
-        if result.get('success'):
-            if query_type == 'available_slots':
-                data = result.get('data', [])
-                count = len(data)
-                return f"Found {count} available parking slots."
-            
-            elif query_type == 'booked_slots':
-                data = result.get('data', [])
-                count = len(data)
-                return f"Found {count} booked parking slots."
-            
-            elif query_type == 'book_slot':
-                slot_id = query_info.get('parameters', {}).get('slot_id', 'unknown')
-                return f"Slot {slot_id} has been booked successfully."
-            
-            elif query_type == 'release_slot':
-                slot_id = query_info.get('parameters', {}).get('slot_id', 'unknown')
-                return f"Slot {slot_id} has been released successfully."
-            
-            elif query_type in ['all_slots', 'vehicles', 'users', 'parking_logs']:
-                data = result.get('data', [])
-                count = len(data)
-                return f"Retrieved {count} records from {query_info['table']}."
-            
-            else:
-                return f"Query executed successfully: {description}"
-        
-        else:
-            error_msg = result.get('error', 'Unknown error')
-            return f"Query failed: {error_msg}"
-            
-    except Exception as e:
-        logger.error(f"Error generating TTS response: {e}")
-        return "Query processed, but could not generate voice response."
-
 # Error handlers to return JSON instead of HTML
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({
         'success': False,
         'error': 'Endpoint not found',
-        'timestamp': datetime.now().isoformat()
+        'timestamp': g.ts
     }), 404
 
 @app.errorhandler(500)
@@ -228,7 +300,7 @@ def internal_error(error):
     return jsonify({
         'success': False,
         'error': 'Internal server error',
-        'timestamp': datetime.now().isoformat()
+        'timestamp': g.ts
     }), 500
 
 if __name__ == '__main__':
@@ -237,10 +309,10 @@ if __name__ == '__main__':
         config.validate_config()
         logger.info("Configuration validated successfully")
     except ValueError as e:
-        logger.error(f"Configuration error: {e}")
+        logger.error("Configuration error: %s", e)
         logger.error("Please check your environment variables and .env file")
         exit(1)
     
     # Run the application
-    logger.info(f"Starting application on {config.HOST}:{config.PORT}")
+    logger.info("Starting application on %s:%s", config.HOST, config.PORT)
     app.run(debug=config.DEBUG, host=config.HOST, port=config.PORT)
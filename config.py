@@ -4,54 +4,84 @@ Contains all configuration settings and environment variable handling
 """
 
 import os
+from dataclasses import dataclass
+from functools import lru_cache
 from dotenv import load_dotenv
 
-# Load environment variables from .env file
+# Load environment variables from .env file and snapshot them once
 load_dotenv()
+_env = os.environ.copy()
+_env_errors = []
 
+def _env_str(name, default):
+    return _env.get(name, default)
+
+def _env_bool(name, default):
+    return _env.get(name, default).lower() == 'true'
+
+def _env_int(name, default):
+    value = _env.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        _env_errors.append(f"{name}={value!r}")
+        return default
+
+@dataclass(frozen=True)
 class Config:
     """Base configuration class"""
     
     # Supabase Configuration
-    SUPABASE_URL = os.getenv('SUPABASE_URL', '')
-    SUPABASE_KEY = os.getenv('SUPABASE_KEY', '')
+    SUPABASE_URL: str = _env_str('SUPABASE_URL', '')
+    SUPABASE_KEY: str = _env_str('SUPABASE_KEY', '')
     
     # Flask Configuration
-    SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
-    DEBUG = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
-    HOST = os.getenv('FLASK_HOST', '0.0.0.0')
-    PORT = int(os.getenv('FLASK_PORT', 5000))
+    SECRET_KEY: str = _env_str('SECRET_KEY', 'dev-secret-key-change-in-production')
+    DEBUG: bool = _env_bool('FLASK_DEBUG', 'True')
+    HOST: str = _env_str('FLASK_HOST', '0.0.0.0')
+    PORT: int = _env_int('FLASK_PORT', 5000)
     
     # Voice Recognition Configuration
-    VOICE_TIMEOUT = int(os.getenv('VOICE_TIMEOUT', 5))
-    VOICE_PHRASE_LIMIT = int(os.getenv('VOICE_PHRASE_LIMIT', 10))
-    VOICE_LANGUAGE = os.getenv('VOICE_LANGUAGE', 'en-US')
+    VOICE_TIMEOUT: int = _env_int('VOICE_TIMEOUT', 5)
+    VOICE_PHRASE_LIMIT: int = _env_int('VOICE_PHRASE_LIMIT', 10)
+    VOICE_LANGUAGE: str = _env_str('VOICE_LANGUAGE', 'en-US')
     
     # Text-to-Speech Configuration
-    TTS_LANGUAGE = os.getenv('TTS_LANGUAGE', 'en')
-    TTS_SLOW = os.getenv('TTS_SLOW', 'False').lower() == 'true'
+    TTS_LANGUAGE: str = _env_str('TTS_LANGUAGE', 'en')
+    TTS_SLOW: bool = _env_bool('TTS_SLOW', 'False')
     
     # Database Configuration
-    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
-    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))
+    DB_POOL_SIZE: int = _env_int('DB_POOL_SIZE', 10)
+    DB_MAX_OVERFLOW: int = _env_int('DB_MAX_OVERFLOW', 20)
+    DB_KEEPALIVE_EXPIRY: int = _env_int('DB_KEEPALIVE_EXPIRY', 30)
+    HEALTH_CHECK_TTL: int = _env_int('HEALTH_CHECK_TTL', 5)
+    
+    # Response Compression (Flask-Compress)
+    COMPRESS_MIMETYPES: tuple = ('application/json',)
+    COMPRESS_LEVEL: int = _env_int('COMPRESS_LEVEL', 4)
+    # Leave streamed responses alone: Flask-Compress buffers the whole generator to
+    # compress it, which would undo /query's chunked output for large results.
+    # Large row sets therefore go out streamed and uncompressed.
+    COMPRESS_STREAMS: bool = False
     
     # Logging Configuration
-    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
-    LOG_FILE = os.getenv('LOG_FILE', 'app.log')
+    LOG_LEVEL: str = _env_str('LOG_LEVEL', 'INFO')
+    LOG_FILE: str = _env_str('LOG_FILE', 'app.log')
     
     # Security Configuration
-    SESSION_COOKIE_SECURE = os.getenv('SESSION_COOKIE_SECURE', 'False').lower() == 'true'
-    SESSION_COOKIE_HTTPONLY = True
-    SESSION_COOKIE_SAMESITE = 'Lax'
+    SESSION_COOKIE_SECURE: bool = _env_bool('SESSION_COOKIE_SECURE', 'False')
+    SESSION_COOKIE_HTTPONLY: bool = True
+    SESSION_COOKIE_SAMESITE: str = 'Lax'
     
-    @classmethod
-    def validate_config(cls):
+    def validate_config(self):
         """Validate that all required configuration is present"""
         required_vars = ['SUPABASE_URL', 'SUPABASE_KEY']
         missing_vars = []
         
         for var in required_vars:
-            if not getattr(cls, var):
+            if not getattr(self, var):
                 missing_vars.append(var)
         
         if missing_vars:
@@ -59,23 +89,30 @@ class Config:
         
         return True
 
+@dataclass(frozen=True)
 class DevelopmentConfig(Config):
     """Development configuration"""
-    DEBUG = True
-    LOG_LEVEL = 'DEBUG'
+    DEBUG: bool = True
+    LOG_LEVEL: str = 'DEBUG'
 
+@dataclass(frozen=True)
 class ProductionConfig(Config):
     """Production configuration"""
-    DEBUG = False
-    SESSION_COOKIE_SECURE = True
-    LOG_LEVEL = 'WARNING'
+    DEBUG: bool = False
+    SESSION_COOKIE_SECURE: bool = True
+    LOG_LEVEL: str = 'WARNING'
 
+@dataclass(frozen=True)
 class TestingConfig(Config):
     """Testing configuration"""
-    TESTING = True
-    DEBUG = True
-    SUPABASE_URL = 'test-url'
-    SUPABASE_KEY = 'test-key'
+    TESTING: bool = True
+    DEBUG: bool = True
+    SUPABASE_URL: str = 'test-url'
+    SUPABASE_KEY: str = 'test-key'
+
+# Fail at import with every malformed value, not on first use of one
+if _env_errors:
+    raise ValueError(f"Invalid integer environment variables: {', '.join(_env_errors)}")
 
 # Configuration dictionary
 config = {
@@ -85,7 +122,8 @@ config = {
     'default': DevelopmentConfig
 }
 
+@lru_cache(maxsize=1)
 def get_config():
-    """Get configuration based on environment"""
-    env = os.getenv('FLASK_ENV', 'default')
-    return config.get(env, config['default'])
+    """Get configuration based on environment (resolved once per process)"""
+    env = _env_str('FLASK_ENV', 'default')
+    return config.get(env, config['default'])()
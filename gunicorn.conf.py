@@ -0,0 +1,42 @@
+"""
+Gunicorn configuration for AI Powered Voice-to-Query Parking Management System
+Threaded workers let concurrent /query requests overlap their Supabase I/O
+"""
+
+import os
+import multiprocessing
+
+from config import get_config
+
+config = get_config()
+
+bind = f"{config.HOST}:{config.PORT}"
+worker_class = 'gthread'
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+# One thread per pooled PostgREST connection, so every in-flight request
+# can hold a connection without queueing on the pool
+threads = int(os.getenv('GUNICORN_THREADS', config.DB_POOL_SIZE + config.DB_MAX_OVERFLOW))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+loglevel = config.LOG_LEVEL.lower()
+accesslog = '-'
+
+# Import the app (and warm the classifier) once in the master, then fork, so
+# workers share model weights copy-on-write. Off by default: a CUDA context
+# created before fork cannot be used by the children, so enable it only for
+# CPU inference.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'False').lower() == 'true'
+
+
+def post_fork(server, worker):
+    # The master's log listener thread does not survive fork
+    if preload_app:
+        from app import start_log_listener
+        start_log_listener()
+
+
+def post_worker_init(worker):
+    # Open this worker's pooled PostgREST connection before it takes traffic.
+    # Runs after the app is loaded (and after fork), so the socket is never
+    # shared with the master or another worker.
+    from supabase_module import get_manager
+    get_manager().ping()
@@ -6,16 +6,19 @@ Provides an easy way to start the application with proper error handling
 
 import sys
 import os
+import importlib.util
 import logging
-from pathlib import Path
 
 def check_environment():
     """Check if the environment is properly set up"""
     print("🔍 Checking environment...")
     
+    # One directory listing answers every presence check below
+    with os.scandir('.') as entries:
+        existing = {entry.name for entry in entries}
+    
     # Check if .env file exists
-    env_file = Path(".env")
-    if not env_file.exists():
+    if ".env" not in existing:
         print("❌ .env file not found!")
         print("   Please run 'python setup.py' first or create .env file manually")
         return False
@@ -23,7 +26,7 @@ def check_environment():
     # Check if required directories exist
     required_dirs = ['templates', 'static']
     for directory in required_dirs:
-        if not Path(directory).exists():
+        if directory not in existing:
             print(f"❌ Required directory '{directory}' not found!")
             return False
     
@@ -42,12 +45,12 @@ def check_dependencies():
         ('dotenv', 'python-dotenv')
     ]
     
-    missing_modules = []
-    for module, display_name in required_modules:
-        try:
-            __import__(module)
-        except (ImportError, Exception) as e:
-            missing_modules.append(display_name)
+    # find_spec only locates the package; the app import below loads it for real
+    missing_modules = [
+        display_name
+        for module, display_name in required_modules
+        if importlib.util.find_spec(module) is None
+    ]
     
     if missing_modules:
         print(f"⚠️  Warning: Some dependencies may not be properly installed: {', '.join(missing_modules)}")
@@ -80,6 +83,14 @@ def main():
     if not check_dependencies():
         sys.exit(1)
     
+    # Outside debug mode, hand the process over to gunicorn's threaded workers
+    # instead of Werkzeug's dev server (gunicorn does not run on Windows)
+    from config import get_config
+    if not get_config().DEBUG and os.name != 'nt' and importlib.util.find_spec('gunicorn') is not None:
+        print("🌐 Starting gunicorn with gunicorn.conf.py")
+        print("="*70)
+        os.execvp(sys.executable, [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'])
+
     # Import and run the application
     try:
         print("🔍 Loading application...")
@@ -3,24 +3,143 @@ Supabase module for database operations
 Handles all database interactions with Supabase
 """
 
-import os
+import re
+import httpx
+import orjson
+from functools import lru_cache, partial
 from supabase import create_client, Client
 from typing import List, Dict, Any, Optional
-from dotenv import load_dotenv
+from config import get_config
 
-# Load environment variables
-load_dotenv()
+# SELECT parsing: filter values (the verb and table name are split out with str methods)
+_SELECT_STATUS_RE = re.compile(r"status\s*=\s*['\"](available|booked|maintenance)['\"]")
+_SELECT_SLOT_ID_RE = re.compile(r"where\s+slot_id\s*[=<>]\s*(\d+)")
+
+# UPDATE parsing: a numeric slot_id comparison anywhere in the statement,
+# the SET status value, and a status condition in the WHERE clause
+_UPDATE_SLOT_ID_RE = re.compile(r"slot_id\s*[=<>]\s*(\d+)")
+_STATUS_SET_RE = re.compile(r"status\s*=\s*['\"](\w+)['\"]")
+_WHERE_STATUS_RE = re.compile(r"where\s+status\s*=\s*['\"](\w+)['\"]")
+# Bounded and stopped at ';' so a long or malformed query cannot backtrack far
+_WHERE_ANY_STATUS_RE = re.compile(r"where\s+[^;]{0,200}?status\s*=\s*['\"](\w+)['\"]")
+_LIMIT_RE = re.compile(r"limit\s+(\d+)")
+
+# Columns the UI tables render; reads fetch only these instead of select('*').
+# users has no table view (the UI dumps the raw rows), so it keeps every column.
+DEFAULT_SLOT_COLS = "slot_id,location,status,floor_no,slot_type"
+DEFAULT_VEHICLE_COLS = "vehicle_id,vehicle_no,vehicle_type,user_id"
+DEFAULT_LOG_COLS = "log_id,vehicle_id,slot_id,entry_time,exit_time,total_amount,payment_status"
+_SELECT_COLUMNS = {
+    'parking_slots': DEFAULT_SLOT_COLS,
+    'vehicles': DEFAULT_VEHICLE_COLS,
+    'users': '*',
+    'parking_logs': DEFAULT_LOG_COLS,
+}
+
+class _ORJSONResponse(httpx.Response):
+    """httpx response whose .json() decodes the raw bytes with orjson"""
+    
+    def json(self, **kwargs: Any) -> Any:
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError, so postgrest's handling still applies
+        return orjson.loads(self.content)
+
+class _ORJSONTransport(httpx.HTTPTransport):
+    """Pooled transport that hands PostgREST orjson-decoding responses"""
+    
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        response = super().handle_request(request)
+        return _ORJSONResponse(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=response.stream,
+            extensions=response.extensions,
+            request=request,
+        )
 
 class SupabaseManager:
     def __init__(self):
         """Initialize Supabase client"""
-        self.url = os.getenv("SUPABASE_URL")
-        self.key = os.getenv("SUPABASE_KEY")
+        # Credentials come from config's one-time .env snapshot
+        config = get_config()
+        self.url = config.SUPABASE_URL
+        self.key = config.SUPABASE_KEY
         
         if not self.url or not self.key:
             raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
         
         self.supabase: Client = create_client(self.url, self.key)
+        self.pool_limits: Optional[httpx.Limits] = None
+        self._bind_tables()
+        self._query_handlers = {
+            'select': self._handle_select_query,
+            'insert': self._handle_insert_query,
+            'update': self._handle_update_query,
+            'delete': self._handle_delete_query,
+        }
+        self._select_handlers = {
+            'parking_slots': self._select_parking_slots,
+            'vehicles': partial(self._select_all, 'vehicles'),
+            'users': partial(self._select_all, 'users'),
+            'parking_logs': partial(self._select_all, 'parking_logs'),
+        }
+    
+    def configure_pool(self, pool_maxsize: int = 30, pool_keepalive: int = 10, retries: int = 3,
+                       timeout: float = 5.0, connect_timeout: float = 2.0,
+                       keepalive_expiry: float = 30.0) -> None:
+        """
+        Replace the PostgREST HTTP session with a pooled one shared across requests
+        Keeps TCP/TLS connections alive between queries and caps open sockets;
+        HTTP/2 multiplexes concurrent queries over one TLS connection, and
+        response bodies are decoded with orjson instead of the stdlib json module
+        """
+        session = self.supabase.postgrest.session
+        self.pool_limits = httpx.Limits(
+            max_connections=pool_maxsize,
+            max_keepalive_connections=pool_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.supabase.postgrest.session = type(session)(
+            base_url=session.base_url,
+            headers=session.headers,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            transport=_ORJSONTransport(limits=self.pool_limits, retries=retries, http2=True),
+        )
+        session.close()
+        # Cached table builders hold the session they were created with
+        self._bind_tables()
+    
+    def _bind_tables(self) -> None:
+        """
+        Build one request builder per table and reuse it for every query
+        Each .select()/.update() on it returns a fresh query builder, so sharing is safe
+        """
+        self._tables = {
+            name: self.supabase.table(name)
+            for name in ('parking_slots', 'vehicles', 'users', 'parking_logs')
+        }
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Report configured and currently open PostgREST connections"""
+        if self.pool_limits is None:
+            return {"configured": False}
+        transport = self.supabase.postgrest.session._transport
+        pool = getattr(transport, '_pool', None)
+        return {
+            "configured": True,
+            "max_connections": self.pool_limits.max_connections,
+            "max_keepalive_connections": self.pool_limits.max_keepalive_connections,
+            "keepalive_expiry": self.pool_limits.keepalive_expiry,
+            "http2": True,
+            "open_connections": len(getattr(pool, 'connections', [])),
+        }
+    
+    def ping(self) -> Dict[str, Any]:
+        """Probe the database with a single one-row read"""
+        try:
+            self._tables['parking_slots'].select('slot_id').limit(1).execute()
+            return {"success": True}
+        except Exception as e:
+            return {"error": f"Database probe failed: {str(e)}"}
     
     def execute_query(self, query: str) -> Dict[str, Any]:
         """
@@ -30,63 +149,69 @@ class SupabaseManager:
         """
         try:
             # For demonstration, we'll parse the query and use appropriate methods
+            # Lowercased once here and threaded through every handler
             query_lower = query.lower().strip()
-            
-            if query_lower.startswith('select'):
-                return self._handle_select_query(query)
-            elif query_lower.startswith('insert'):
-                return self._handle_insert_query(query)
-            elif query_lower.startswith('update'):
-                return self._handle_update_query(query)
-            elif query_lower.startswith('delete'):
-                return self._handle_delete_query(query)
-            else:
+            # The verb is the first whitespace-delimited token
+            tokens = query_lower.split(None, 1)
+            handler = self._query_handlers.get(tokens[0]) if tokens else None
+            if handler is None:
                 return {"error": "Unsupported query type"}
+            return handler(query, query_lower)
                 
         except Exception as e:
             return {"error": f"Query execution failed: {str(e)}"}
     
-    def _handle_select_query(self, query: str) -> Dict[str, Any]:
+    def _handle_select_query(self, query: str, query_lower: str) -> Dict[str, Any]:
         """Handle SELECT queries"""
         try:
-            query_lower = query.lower()
-            import re
-            
-            if 'parking_slots' in query_lower:
-                # Check for explicit slot_id filter, e.g., WHERE slot_id = 12
-                slot_id_match = re.search(r"where\s+slot_id\s*[=<>]\s*(\d+)", query_lower)
-                if slot_id_match:
-                    slot_id = int(slot_id_match.group(1))
-                    result = self.supabase.table('parking_slots').select('*').eq('slot_id', slot_id).order('slot_id').execute()
-                elif 'status' in query_lower and 'available' in query_lower:
-                    result = self.supabase.table('parking_slots').select('*').eq('status', 'available').order('slot_id').execute()
-                elif 'status' in query_lower and 'booked' in query_lower:
-                    result = self.supabase.table('parking_slots').select('*').eq('status', 'booked').order('slot_id').execute()
-                elif 'status' in query_lower and 'maintenance' in query_lower:
-                    result = self.supabase.table('parking_slots').select('*').eq('status', 'maintenance').order('slot_id').execute()
-                else:
-                    result = self.supabase.table('parking_slots').select('*').order('slot_id').execute()
-                return {"success": True, "data": result.data}
-            
-            elif 'vehicles' in query_lower:
-                result = self.supabase.table('vehicles').select('*').execute()
-                return {"success": True, "data": result.data}
-            
-            elif 'users' in query_lower:
-                result = self.supabase.table('users').select('*').execute()
-                return {"success": True, "data": result.data}
-            
-            elif 'parking_logs' in query_lower:
-                result = self.supabase.table('parking_logs').select('*').execute()
-                return {"success": True, "data": result.data}
-            
-            else:
+            # Table name is the token after the first FROM, minus any closing punctuation;
+            # splitting on any whitespace finds FROM after a newline or tab too
+            words = query_lower.split()
+            try:
+                table = words[words.index('from') + 1].rstrip(';)')
+            except (ValueError, IndexError):
+                table = None
+            handler = self._select_handlers.get(table)
+            if handler is None:
                 return {"error": "Table not found in query"}
+            if query_lower.startswith('select count('):
+                if table != 'parking_slots':
+                    return {"error": "COUNT is only supported on parking_slots"}
+                return {"success": True, "data": [], "count": self._count_parking_slots(query_lower)}
+            return {"success": True, "data": handler(query_lower)}
                 
         except Exception as e:
             return {"error": f"SELECT query failed: {str(e)}"}
     
-    def _handle_insert_query(self, query: str) -> Dict[str, Any]:
+    def _select_parking_slots(self, query_lower: str) -> List[Dict[str, Any]]:
+        """SELECT from parking_slots, filtered by slot_id or status when present"""
+        builder = self._tables['parking_slots'].select(DEFAULT_SLOT_COLS)
+        # Check for explicit slot_id filter, e.g., WHERE slot_id = 12
+        slot_id_match = _SELECT_SLOT_ID_RE.search(query_lower)
+        if slot_id_match:
+            builder = builder.eq('slot_id', int(slot_id_match.group(1)))
+        else:
+            status_match = _SELECT_STATUS_RE.search(query_lower)
+            if status_match:
+                builder = builder.eq('status', status_match.group(1))
+        return builder.order('slot_id').execute().data
+    
+    def _count_parking_slots(self, query_lower: str) -> int:
+        """
+        SELECT COUNT(*) from parking_slots, filtered by status when present
+        PostgREST returns the exact count in Content-Range, so at most one row is fetched
+        """
+        builder = self._tables['parking_slots'].select('slot_id', count='exact')
+        status_match = _SELECT_STATUS_RE.search(query_lower)
+        if status_match:
+            builder = builder.eq('status', status_match.group(1))
+        return builder.limit(1).execute().count
+    
+    def _select_all(self, table: str, query_lower: str) -> List[Dict[str, Any]]:
+        """SELECT every row from a table without filters"""
+        return self._tables[table].select(_SELECT_COLUMNS[table]).execute().data
+    
+    def _handle_insert_query(self, query: str, query_lower: str) -> Dict[str, Any]:
         """Handle INSERT queries"""
         try:
             # This is a simplified implementation
@@ -95,42 +220,28 @@ class SupabaseManager:
         except Exception as e:
             return {"error": f"INSERT query failed: {str(e)}"}
     
-    def _handle_update_query(self, query: str) -> Dict[str, Any]:
+    def _handle_update_query(self, query: str, query_lower: str) -> Dict[str, Any]:
         """Handle UPDATE queries"""
         try:
-            query_lower = query.lower()
-            import re
-            
             if 'parking_slots' in query_lower and 'status' in query_lower:
                 # Extract status value from SET clause
-                status_match = re.search(r"status\s*=\s*['\"](\w+)['\"]", query_lower)
+                status_match = _STATUS_SET_RE.search(query_lower)
                 if not status_match:
                     return {"error": "Could not parse status from query"}
                 
                 new_status = status_match.group(1)
                 
                 # Check if this is a bulk update (no slot_id in WHERE clause, or WHERE status=something)
-                slot_id_match = re.search(r'slot_id\s*[=<>]\s*(\d+)', query_lower)
-                if not slot_id_match:
-                    slot_id_match = re.search(r'where\s+slot_id\s*[=<>]\s*(\d+)', query_lower)
+                slot_id_match = _UPDATE_SLOT_ID_RE.search(query_lower)
                 
                 # Check for subquery (book any slot)
                 has_subquery = 'select' in query_lower and 'limit' in query_lower
                 
                 if has_subquery:
-                    # Handle "book any slot" - find first available and book it
+                    # Handle "book any slot" - book the first LIMIT k available slots
                     if new_status == 'booked':
-                        # Get first available slot
-                        available = self.supabase.table('parking_slots').select('slot_id').eq('status', 'available').order('slot_id').limit(1).execute()
-                        if not available.data or len(available.data) == 0:
-                            return {"success": False, "error": "No available slots to book"}
-                        slot_id = available.data[0]['slot_id']
-                        result = self.supabase.table('parking_slots').update({'status': new_status}).eq('slot_id', slot_id).execute()
-                        return {
-                            "success": True,
-                            "data": result.data,
-                            "message": f"Slot {slot_id} booked successfully"
-                        }
+                        limit_match = _LIMIT_RE.search(query_lower)
+                        return self.book_slots(int(limit_match.group(1)) if limit_match else 1)
                     else:
                         return {"error": "Subquery only supported for booking slots"}
                 
@@ -139,15 +250,15 @@ class SupabaseManager:
                     slot_id = int(slot_id_match.group(1))
                     
                     # Check if there's an additional status condition in WHERE clause
-                    where_status_match = re.search(r"where.*status\s*=\s*['\"](\w+)['\"]", query_lower)
+                    where_status_match = _WHERE_ANY_STATUS_RE.search(query_lower)
                     
                     if where_status_match:
                         # Update only if current status matches
                         old_status = where_status_match.group(1)
-                        result = self.supabase.table('parking_slots').update({'status': new_status}).eq('slot_id', slot_id).eq('status', old_status).execute()
+                        result = self._tables['parking_slots'].update({'status': new_status}).eq('slot_id', slot_id).eq('status', old_status).execute()
                     else:
                         # Update regardless of current status
-                        result = self.supabase.table('parking_slots').update({'status': new_status}).eq('slot_id', slot_id).execute()
+                        result = self._tables['parking_slots'].update({'status': new_status}).eq('slot_id', slot_id).execute()
                     
                     status_action = 'booked' if new_status == 'booked' else 'released' if new_status == 'available' else 'updated'
                     return {
@@ -157,13 +268,13 @@ class SupabaseManager:
                     }
                 else:
                     # Bulk update - check for WHERE status condition
-                    where_status_match = re.search(r"where\s+status\s*=\s*['\"](\w+)['\"]", query_lower)
+                    where_status_match = _WHERE_STATUS_RE.search(query_lower)
                     
                     if where_status_match:
                         # Update all slots with specific status
                         old_status = where_status_match.group(1)
-                        result = self.supabase.table('parking_slots').update({'status': new_status}).eq('status', old_status).execute()
-                        count = len(result.data) if result.data else 0
+                        result = self._tables['parking_slots'].update({'status': new_status}).eq('status', old_status).execute()
+                        count = len(result.data or ())
                         status_action = 'booked' if new_status == 'booked' else 'released' if new_status == 'available' else 'updated'
                         return {
                             "success": True,
@@ -179,17 +290,17 @@ class SupabaseManager:
         except Exception as e:
             return {"error": f"UPDATE query failed: {str(e)}"}
     
-    def _handle_delete_query(self, query: str) -> Dict[str, Any]:
+    def _handle_delete_query(self, query: str, query_lower: str) -> Dict[str, Any]:
         """Handle DELETE queries"""
         try:
             return {"success": True, "message": "DELETE query executed (simplified)"}
         except Exception as e:
             return {"error": f"DELETE query failed: {str(e)}"}
     
-    def get_available_slots(self) -> Dict[str, Any]:
+    def get_available_slots(self, cols: str = DEFAULT_SLOT_COLS) -> Dict[str, Any]:
         """Get all available parking slots"""
         try:
-            result = self.supabase.table('parking_slots').select('*').eq('status', 'available').execute()
+            result = self._tables['parking_slots'].select(cols).eq('status', 'available').execute()
             return {"success": True, "data": result.data}
         except Exception as e:
             return {"error": f"Failed to get available slots: {str(e)}"}
@@ -197,7 +308,7 @@ class SupabaseManager:
     def book_slot(self, slot_id: int, vehicle_id: int = None) -> Dict[str, Any]:
         """Book a parking slot"""
         try:
-            result = self.supabase.table('parking_slots').update({'status': 'booked'}).eq('slot_id', slot_id).execute()
+            result = self._tables['parking_slots'].update({'status': 'booked'}).eq('slot_id', slot_id).execute()
             return {"success": True, "data": result.data, "message": f"Slot {slot_id} booked successfully"}
         except Exception as e:
             return {"error": f"Failed to book slot: {str(e)}"}
@@ -205,21 +316,46 @@ class SupabaseManager:
     def release_slot(self, slot_id: int) -> Dict[str, Any]:
         """Release a parking slot"""
         try:
-            result = self.supabase.table('parking_slots').update({'status': 'available'}).eq('slot_id', slot_id).execute()
+            result = self._tables['parking_slots'].update({'status': 'available'}).eq('slot_id', slot_id).execute()
             return {"success": True, "data": result.data, "message": f"Slot {slot_id} released successfully"}
         except Exception as e:
             return {"error": f"Failed to release slot: {str(e)}"}
     
+    def book_slots(self, n: int = 1) -> Dict[str, Any]:
+        """
+        Book the first n available slots
+        One call to the book_next_available SQL function (see supabase_schema.sql) picks
+        and books them atomically, so concurrent callers never get the same slot
+        """
+        try:
+            result = self.supabase.rpc('book_next_available', {'n': n}).execute()
+            if not result.data:
+                return {"success": False, "error": "No available slots to book"}
+            if len(result.data) == 1:
+                message = f"Slot {result.data[0]['slot_id']} booked successfully"
+            else:
+                message = f"{len(result.data)} slots booked successfully"
+            return {"success": True, "data": result.data, "message": message}
+        except Exception as e:
+            return {"error": f"Failed to book slots: {str(e)}"}
+    
     def get_parking_logs(self, vehicle_id: int = None) -> Dict[str, Any]:
         """Get parking logs"""
         try:
+            builder = self._tables['parking_logs'].select(DEFAULT_LOG_COLS)
             if vehicle_id:
-                result = self.supabase.table('parking_logs').select('*').eq('vehicle_id', vehicle_id).execute()
-            else:
-                result = self.supabase.table('parking_logs').select('*').execute()
-            return {"success": True, "data": result.data}
+                builder = builder.eq('vehicle_id', vehicle_id)
+            return {"success": True, "data": builder.execute().data}
         except Exception as e:
             return {"error": f"Failed to get parking logs: {str(e)}"}
 
-# Global instance
-supabase_manager = SupabaseManager()
+@lru_cache(maxsize=None)
+def get_manager() -> SupabaseManager:
+    """Create the shared SupabaseManager on first use instead of at import"""
+    return SupabaseManager()
+
+def __getattr__(name: str) -> Any:
+    # Keep `from supabase_module import supabase_manager` working, lazily
+    if name == 'supabase_manager':
+        return get_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -52,7 +52,10 @@ CREATE TABLE IF NOT EXISTS parking_logs (
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_vehicles_user_id ON vehicles(user_id);
 CREATE INDEX IF NOT EXISTS idx_vehicles_vehicle_no ON vehicles(vehicle_no);
-CREATE INDEX IF NOT EXISTS idx_parking_slots_status ON parking_slots(status);
+-- (status, slot_id) serves both status filters and the ORDER BY slot_id the app always applies
+CREATE INDEX IF NOT EXISTS idx_parking_slots_status_slot_id ON parking_slots(status, slot_id);
+-- Superseded by the composite index above; drop it where an older schema created it
+DROP INDEX IF EXISTS idx_parking_slots_status;
 CREATE INDEX IF NOT EXISTS idx_parking_slots_floor ON parking_slots(floor_no);
 CREATE INDEX IF NOT EXISTS idx_parking_logs_vehicle_id ON parking_logs(vehicle_id);
 CREATE INDEX IF NOT EXISTS idx_parking_logs_slot_id ON parking_logs(slot_id);
@@ -77,6 +80,21 @@ CREATE TRIGGER update_vehicles_updated_at BEFORE UPDATE ON vehicles
 CREATE TRIGGER update_parking_slots_updated_at BEFORE UPDATE ON parking_slots
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Book the first n available slots in one atomic statement
+-- SKIP LOCKED lets concurrent callers claim different slots instead of the same one
+CREATE OR REPLACE FUNCTION book_next_available(n INTEGER DEFAULT 1)
+RETURNS SETOF parking_slots AS $$
+    UPDATE parking_slots SET status = 'booked'
+    WHERE slot_id IN (
+        SELECT slot_id FROM parking_slots
+        WHERE status = 'available'
+        ORDER BY slot_id
+        LIMIT n
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *;
+$$ language 'sql';
+
 -- Insert sample data
 INSERT INTO users (name, phone, email) VALUES
 ('John Doe', '+1234567890', 'john.doe@email.com'),
@@ -0,0 +1,16 @@
+"""
+WSGI entry point for AI Powered Voice-to-Query Parking Management System
+Exposes the Flask app for production servers (gunicorn, uWSGI, ...)
+
+Usage:
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+from app import app, config
+from ai_pipeline.local_orchestrator import warm_up
+
+# Fail fast in the master process instead of on the first request
+config.validate_config()
+
+# Pay model load, CUDA context and kernel selection before serving traffic
+warm_up()